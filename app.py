@@ -1,126 +1,200 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import hashlib
 from io import BytesIO
+from itertools import chain, islice
+from operator import itemgetter
 from datetime import date
+from pandas.api.types import infer_dtype, is_datetime64_any_dtype, is_float_dtype
+from openpyxl import load_workbook
+
+try:
+    from numba import njit
+except ImportError:  # numba é opcional; sem ele usamos só o caminho pandas
+    njit = None
 
 # =========================
 # Configuração
 # =========================
 st.set_page_config(page_title="NFS a Pagar", layout="wide")
-COLUMNS = ["FORNECEDOR", "CNPJ", "NUMERO", "DATA", "VALOR"]
+TEXT_DTYPE = "string[pyarrow]"
+# Tipos das colunas da base (a ordem define COLUMNS)
+SCHEMA = {
+    "FORNECEDOR": TEXT_DTYPE,
+    "CNPJ": TEXT_DTYPE,
+    "NUMERO": TEXT_DTYPE,
+    "DATA": "datetime64[ns]",
+    "VALOR": "float64",
+}
+COLUMNS = list(SCHEMA)
+PAGE_SIZE = 200  # linhas enviadas ao data_editor por vez
+
+# Cabeçalhos reconhecidos na importação: nomes exatos e trechos contidos
+HEADER_ALIASES = {
+    "CNPJ": "CNPJ", "CPF": "CNPJ", "CNPJ/CPF": "CNPJ", "CNPJ / CPF": "CNPJ",
+    "N°": "NUMERO", "Nº": "NUMERO", "NUMERO": "NUMERO", "N° NF": "NUMERO",
+    "Nº NF": "NUMERO", "NF": "NUMERO", "N": "NUMERO", "N.": "NUMERO",
+}
+HEADER_CONTAINS = [("FORNECEDOR", "FORNECEDOR"), ("DATA", "DATA"), ("VALOR", "VALOR")]
+# Textos tratados como célula vazia (os mesmos na_values padrão do pd.read_excel)
+NA_STRINGS = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
 
 # =========================
 # Utilidades
 # =========================
+# Base vazia já tipada, montada uma vez; empty_df devolve cópias dela
+_EMPTY = pd.DataFrame({c: pd.array([], dtype=d) for c, d in SCHEMA.items()})
+
 def empty_df() -> pd.DataFrame:
-    df = pd.DataFrame(columns=COLUMNS)
-    df["FORNECEDOR"] = df["FORNECEDOR"].astype(object)
-    df["CNPJ"] = df["CNPJ"].astype(object)
-    df["NUMERO"] = df["NUMERO"].astype(object)
-    df["DATA"] = pd.Series([], dtype="datetime64[ns]")
-    df["VALOR"] = pd.Series([], dtype="float")
-    return df
-
-def only_digits(s: str) -> str:
-    if s is None or pd.isna(s):
-        return ""
-    return "".join(ch for ch in str(s) if ch.isdigit())
-
-def norm_text(s: str) -> str:
-    if s is None or pd.isna(s):
-        return ""
-    return str(s).strip()
-
-def norm_numero(s: str) -> str:
-    s = str(s)
-    if s.lower() in ("nan", "nat", "none"):
-        return ""
-    return s.replace(".0", "").strip()
-
-def parse_val(x):
-    # Tenta converter para float, aceitando vírgula como decimal
-    if isinstance(x, str):
-        x = x.replace(".", "").replace(",", ".")
-    return pd.to_numeric(x, errors="coerce")
-
-def detect_and_load_excel(file) -> pd.DataFrame:
-    xl = pd.ExcelFile(file)
-    sheet = xl.sheet_names[0]
-    raw = xl.parse(sheet, header=None)
-
-    # Tenta achar linha de cabeçalho
-    header_idx = None
-    for i in range(min(10, len(raw))):
-        row = raw.iloc[i].astype(str).str.upper().tolist()
-        if any("FORNECEDOR" in x for x in row) and any("VALOR" in x for x in row):
-            header_idx = i
-            break
-    if header_idx is None:
-        header_idx = 0
-
-    df = xl.parse(sheet, header=header_idx)
-
-    # Renomeia colunas para o padrão
-    rename_map = {}
-    for col in df.columns:
-        up = str(col).strip().upper()
-        if "FORNECEDOR" in up: rename_map[col] = "FORNECEDOR"
-        elif up in ("CNPJ","CPF","CNPJ/CPF","CNPJ / CPF"): rename_map[col] = "CNPJ"
-        elif up in ("N°","Nº","NUMERO","N° NF","Nº NF","NF","N","N."): rename_map[col] = "NUMERO"
-        elif "DATA" in up: rename_map[col] = "DATA"
-        elif "VALOR" in up: rename_map[col] = "VALOR"
-    df = df.rename(columns=rename_map)
+    return _EMPTY.copy()
+
+def norm_text(s: pd.Series) -> pd.Series:
+    return s.astype(TEXT_DTYPE).str.strip().fillna("")
+
+def as_text(s: pd.Series) -> pd.Series:
+    # Coluna toda numérica e inteira (Excel promove NF/CNPJ a float): passa por
+    # Int64 e já sai "123" em vez de "123.0", sem mexer na string depois
+    vals = s.dropna()
+    if is_float_dtype(s) and ((vals % 1 == 0) & (vals.abs() < 2**53)).all():
+        s = s.astype("Int64")
+    return s.astype(TEXT_DTYPE)
+
+def only_digits(s: pd.Series) -> pd.Series:
+    # Uma passada só: tira o ".0" de células numéricas e tudo que não é dígito
+    return as_text(s).str.replace(r"\.0$|\D+", "", regex=True).fillna("")
+
+def norm_numero(s: pd.Series) -> pd.Series:
+    # Excel costuma trazer o número como float ("123.0"); sentinelas viram ""
+    s = as_text(s).str.replace(r"(?i)^\s*(?:nan|nat|none)\s*$|\.0\s*$", "", regex=True)
+    return s.str.strip().fillna("")
+
+def contains_mask(values, text: str) -> np.ndarray:
+    # Busca literal sem diferenciar maiúsculas, direto no kernel de substring do Arrow
+    arr = pa.array(pd.array(values, dtype=TEXT_DTYPE))
+    return pc.match_substring(arr, text, ignore_case=True).fill_null(False).to_numpy(zero_copy_only=False)
+
+def as_datetime(s: pd.Series) -> pd.Series:
+    # Evita reconverter colunas que já são datetime (cada rerun passa por aqui)
+    if is_datetime64_any_dtype(s):
+        return s
+    return pd.to_datetime(s, errors="coerce", cache=True)
+
+def parse_val(s: pd.Series) -> pd.Series:
+    # Tenta converter para float, aceitando vírgula como decimal nas células de texto
+    if infer_dtype(s, skipna=True) not in ("string", "mixed", "mixed-integer"):
+        return pd.to_numeric(s, errors="coerce").astype("float64")
+    txt = s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    # Células que já eram número ficam NaN em `txt`; essas convertem direto
+    num = pd.to_numeric(txt, errors="coerce").fillna(pd.to_numeric(s.where(txt.isna()), errors="coerce"))
+    return num.astype("float64")
+
+def canonical_column(name) -> str | None:
+    # Nome padrão (COLUMNS) para um cabeçalho da planilha, ou None se não reconhecido
+    up = str(name).strip().upper()
+    target = HEADER_ALIASES.get(up)
+    if target is None:
+        target = next((t for part, t in HEADER_CONTAINS if part in up), None)
+    return target
+
+def pick_cells(rows, positions: list):
+    # Projeta cada linha nas posições pedidas; linhas curtas são completadas com None
+    get = itemgetter(*positions)
+    width = max(positions) + 1
+    for row in rows:
+        if len(row) < width:
+            row = row + (None,) * (width - len(row))
+        yield get(row)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def detect_and_load_excel(file_bytes: bytes) -> pd.DataFrame:
+    # Lê a primeira aba uma única vez, em modo streaming (read_only) e só com valores
+    wb = load_workbook(BytesIO(file_bytes), read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        # Em read_only o openpyxl confia na tag <dimension> da aba, que muitos
+        # exportadores gravam errada; recalcula a partir das linhas reais
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        head = list(islice(rows, 10))
+        if not head:
+            return empty_df()
+
+        # Tenta achar linha de cabeçalho: primeira das 10 iniciais com FORNECEDOR e VALOR
+        top = np.char.upper(pd.DataFrame(head).astype(str).to_numpy(dtype=str))
+        hits = (np.char.find(top, "FORNECEDOR") >= 0).any(axis=1) & (np.char.find(top, "VALOR") >= 0).any(axis=1)
+        header_idx = int(hits.argmax()) if hits.any() else 0
+
+        # Decide pelo cabeçalho quais colunas interessam (primeira ocorrência
+        # de cada alvo) e só essas são materializadas no DataFrame
+        picks = {}
+        for pos, col in enumerate(head[header_idx]):
+            target = canonical_column(col)
+            if target is not None and target not in picks:
+                picks[target] = pos
+        if not picks:
+            return empty_df()
+
+        # Só as linhas abaixo do cabeçalho viram dados; o resto do arquivo segue em streaming
+        body = chain(head[header_idx + 1:], rows)
+        df = pd.DataFrame(pick_cells(body, list(picks.values())), columns=list(picks))
+    finally:
+        wb.close()
+
+    # Como no read_excel, textos como "#N/A" ou "NA" contam como célula vazia
+    df = df.mask(df.isin(NA_STRINGS))
 
     # Garante colunas alvo
     for c in COLUMNS:
         if c not in df.columns:
             df[c] = None
-    df = df[COLUMNS].copy()
-
-    # Remove rodapés/totalizadores (linha sem fornecedor/numero/data e com valor preenchido)
-    def is_footer(row):
-        return (
-            pd.isna(row.get("FORNECEDOR")) and
-            pd.isna(row.get("NUMERO")) and
-            pd.isna(row.get("DATA")) and
-            pd.notna(row.get("VALOR"))
-        )
-    df = df[~df.apply(is_footer, axis=1)]
 
-    # Normalizações
-    df["FORNECEDOR"] = df["FORNECEDOR"].map(norm_text)
-    df["CNPJ"] = df["CNPJ"].map(only_digits)
-    df["NUMERO"] = df["NUMERO"].map(norm_numero)
-    df["DATA"] = pd.to_datetime(df["DATA"], errors="coerce")
-    df["VALOR"] = df["VALOR"].apply(parse_val)
-
-    # Descarta linhas 100% vazias
-    df = df.dropna(how="all")
-    # Preenche NaN de texto
-    for c in ["FORNECEDOR","CNPJ","NUMERO"]:
-        df[c] = df[c].fillna("")
-    # Valor NaN -> 0.0
-    df["VALOR"] = df["VALOR"].fillna(0.0)
-
-    return df.reset_index(drop=True)
+    # Descarta, numa seleção só, as linhas 100% vazias (o modo read_only também
+    # devolve linhas em branco) e os rodapés/totalizadores (sem fornecedor/numero/data
+    # e com valor preenchido)
+    na = df[COLUMNS].isna()
+    footer = na["FORNECEDOR"] & na["NUMERO"] & na["DATA"] & ~na["VALOR"]
+    keep = ~(na.all(axis=1) | footer).to_numpy()
+    if not keep.all():
+        df = df[keep]
+
+    # Normalizações: cada uma já gera uma coluna nova (texto sem NaN, valor em
+    # centavos), então o resultado é montado direto, sem copiar o recorte antes
+    out = pd.DataFrame({
+        "FORNECEDOR": norm_text(df["FORNECEDOR"]),
+        "CNPJ": only_digits(df["CNPJ"]),
+        "NUMERO": norm_numero(df["NUMERO"]),
+        "DATA": as_datetime(df["DATA"]),
+        "VALOR": parse_val(df["VALOR"]).fillna(0.0).round(2),
+    }, copy=False)
+    out.index = pd.RangeIndex(len(out))
+    return out
 
 def make_key(df: pd.DataFrame) -> pd.Series:
     """
-    Chave para deduplicação:
+    Chave para deduplicação (hash uint64 por linha):
     - Preferência: CNPJ + NUMERO + DATA
-    - Se não houver CNPJ: FORNECEDOR + NUMERO + DATA + VALOR
+    - Se não houver CNPJ: FORNECEDOR + NUMERO + DATA + VALOR (em centavos)
     """
-    cnpj = df["CNPJ"].fillna("").astype(str)
-    numero = df["NUMERO"].fillna("").astype(str)
-    data = pd.to_datetime(df["DATA"], errors="coerce").dt.strftime("%Y-%m-%d").fillna("")
-    valor = pd.to_numeric(df["VALOR"], errors="coerce").fillna(0.0).round(2).astype(str)
-    fornecedor = df["FORNECEDOR"].fillna("").astype(str).str.upper().str.strip()
-
-    key_with_cnpj = (cnpj != "")
-    key = pd.Series(index=df.index, dtype="object")
-    key.loc[key_with_cnpj] = cnpj[key_with_cnpj] + "|" + numero[key_with_cnpj] + "|" + data[key_with_cnpj]
-    key.loc[~key_with_cnpj] = fornecedor[~key_with_cnpj] + "|" + numero[~key_with_cnpj] + "|" + data[~key_with_cnpj] + "|" + valor[~key_with_cnpj]
-    return key
+    cnpj = df["CNPJ"].fillna("").astype(TEXT_DTYPE)
+    numero = df["NUMERO"].fillna("").astype(TEXT_DTYPE)
+    data = as_datetime(df["DATA"]).dt.normalize().astype("datetime64[ns]")  # dia de calendário, unidade fixa
+    valor = pd.to_numeric(df["VALOR"], errors="coerce").to_numpy(dtype="float64", na_value=0.0)
+    cents = pd.Series(np.rint(valor * 100).astype(np.int64), index=df.index)
+    fornecedor = df["FORNECEDOR"].fillna("").astype(TEXT_DTYPE).str.upper().str.strip()
+
+    with_cnpj = (cnpj != "").to_numpy(dtype=bool)
+    key = np.empty(len(df), dtype=np.uint64)
+    by_cnpj = pd.DataFrame({"CNPJ": cnpj, "NUMERO": numero, "DATA": data})[with_cnpj]
+    by_forn = pd.DataFrame({"FORNECEDOR": fornecedor, "NUMERO": numero, "DATA": data, "VALOR": cents})[~with_cnpj]
+    key[with_cnpj] = pd.util.hash_pandas_object(by_cnpj, index=False).to_numpy()
+    key[~with_cnpj] = pd.util.hash_pandas_object(by_forn, index=False).to_numpy()
+    return pd.Series(key, index=df.index)
 
 def merge_import(base: pd.DataFrame, incoming: pd.DataFrame, mode: str):
     """
@@ -132,44 +206,150 @@ def merge_import(base: pd.DataFrame, incoming: pd.DataFrame, mode: str):
         new_base = incoming.copy()
         return new_base.reset_index(drop=True), len(incoming), 0
 
-    # append sem duplicar
-    base = base.copy()
-    base_key = make_key(base) if not base.empty else pd.Series([], dtype="object")
+    # append sem duplicar; base vazia não tem o que deduplicar nem concatenar
+    if base.empty:
+        return incoming.reset_index(drop=True), len(incoming), 0
+
+    base_key = make_key(base)
     inc_key = make_key(incoming)
-    existing = set(base_key.tolist())
-    mask_new = ~inc_key.isin(existing)
-    added = incoming[mask_new].copy()
+    mask_new = ~inc_key.isin(base_key)
+    added = incoming[mask_new]
 
     if added.empty:
-        return base.reset_index(drop=True), 0, (len(incoming) - 0)
+        return base, 0, (len(incoming) - 0)
 
     out = pd.concat([base, added], ignore_index=True)
     return out.reset_index(drop=True), len(added), (len(incoming) - len(added))
 
-@st.cache_data
-def to_excel_bytes(df: pd.DataFrame) -> bytes:
-    out = df.copy()
-    out["DATA"] = pd.to_datetime(out["DATA"], errors="coerce").dt.date
+def fits_cents(values: np.ndarray) -> bool:
+    # Só dá para passar para centavos em int64 se todos os valores forem finitos
+    # e longe do limite (inf ou >= ~9.2e16 virariam INT64_MIN sem aviso)
+    return bool(np.isfinite(values).all()) and (len(values) == 0 or float(np.abs(values).max()) < 9e16)
+
+def total_valor(df: pd.DataFrame) -> float:
+    # Soma exata em centavos (int64); VALOR já é float64 sem NaN na base
+    values = df["VALOR"].to_numpy(dtype="float64", na_value=0.0)
+    if not fits_cents(values):
+        # inf/valores gigantes: soma em float mesmo (como antes), sem estourar o int64
+        return float(values.sum())
+    cents = np.rint(values * 100).astype(np.int64)
+    return int(cents.sum()) / 100
+
+def df_fingerprint(df: pd.DataFrame) -> tuple:
+    # Impressão digital barata do conteúdo, usada como chave de cache.
+    # Os hashes por linha são digeridos em sequência (e não somados),
+    # para que uma simples reordenação das linhas mude a chave
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return len(df), hashlib.blake2b(row_hashes.tobytes(), digest_size=16).hexdigest()
+
+def _to_excel_bytes_impl(df: pd.DataFrame) -> bytes:
+    # Mantém DATA como datetime64 (sem objetos date por linha); o formato da
+    # célula é que esconde a hora, como acontecia ao exportar datetime.date
+    out = df.assign(DATA=as_datetime(df["DATA"]).dt.normalize())
     buf = BytesIO()
-    with pd.ExcelWriter(buf, engine="openpyxl") as w:
+    with pd.ExcelWriter(buf, engine="xlsxwriter", datetime_format="YYYY-MM-DD") as w:
         out.to_excel(w, index=False, sheet_name="NFS A PAGAR")
     return buf.getvalue()
 
+@st.cache_data(show_spinner=False, max_entries=8)
+def _to_excel_bytes_cached(fingerprint: tuple, _df: pd.DataFrame) -> bytes:
+    # "_df" não entra no hash do Streamlit; a chave é só a impressão digital
+    return _to_excel_bytes_impl(_df)
+
+def to_excel_bytes(df: pd.DataFrame, fingerprint: tuple | None = None) -> bytes:
+    # Quem já tem a impressão digital (set_base guarda na sessão) evita refazer o hash
+    if fingerprint is None:
+        fingerprint = df_fingerprint(df)
+    return _to_excel_bytes_cached(fingerprint, df)
+
+# Troca "," e "." do formato en-US para o pt-BR num único str.translate
+_BRL_SEP = str.maketrans({",": ".", ".": ","})
+
 def brl(v: float) -> str:
     try:
-        return f"R$ {float(v):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        return f"R$ {float(v):,.2f}".translate(_BRL_SEP)
     except:
         return "R$ 0,00"
 
+_BRL_WIDTH = 40            # bytes por valor no buffer do formatador em lote
+_BRL_BATCH_MIN_ROWS = 2000 # abaixo disso o caminho pandas já é instantâneo
+
+if njit is not None:
+    @njit(cache=True)
+    def _fmt_brl_batch(cents, out):
+        # Escreve "R$ [-]1.234,56" em ASCII, uma linha de `out` por valor.
+        # Monta de trás para frente e inverte no final.
+        for i in range(cents.size):
+            row = out[i]
+            c = cents[i]
+            neg = c < 0
+            if neg:
+                c = -c
+            n = 0
+            for _ in range(2):
+                row[n] = 48 + c % 10
+                c //= 10
+                n += 1
+            row[n] = 44  # ","
+            n += 1
+            k = 0
+            while True:
+                row[n] = 48 + c % 10
+                c //= 10
+                n += 1
+                k += 1
+                if c == 0:
+                    break
+                if k % 3 == 0:
+                    row[n] = 46  # "."
+                    n += 1
+            if neg:
+                row[n] = 45  # "-"
+                n += 1
+            row[n] = 32      # " "
+            row[n + 1] = 36  # "$"
+            row[n + 2] = 82  # "R"
+            n += 3
+            for j in range(n // 2):
+                row[j], row[n - 1 - j] = row[n - 1 - j], row[j]
+else:
+    _fmt_brl_batch = None
+
+def brl_series(s: pd.Series) -> pd.Series:
+    values = s.to_numpy(dtype="float64", na_value=0.0)
+    # O kernel JIT não tem checagem de limites: inf/valores gigantes ficam no pandas
+    if _fmt_brl_batch is not None and len(s) > _BRL_BATCH_MIN_ROWS and fits_cents(values):
+        cents = np.rint(values * 100).astype(np.int64)
+        out = np.zeros((len(s), _BRL_WIDTH), dtype=np.uint8)
+        _fmt_brl_batch(cents, out)
+        # Cada linha vira um bytes de largura fixa; o NUL de preenchimento é descartado
+        return pd.Series(out.view(f"S{_BRL_WIDTH}").ravel().astype(str), index=s.index)
+    # Formata a coluna inteira de uma vez
+    txt = s.fillna(0.0).round(2).map("{:,.2f}".format).str.translate(_BRL_SEP)
+    return "R$ " + txt
+
 def fmt_date_col(series: pd.Series) -> pd.Series:
-    s = pd.to_datetime(series, errors="coerce")
+    s = as_datetime(series)
     return s.dt.strftime("%d/%m/%Y")
 
+def set_base(df: pd.DataFrame) -> None:
+    # Grava a base na sessão e já recalcula os agregados exibidos,
+    # para que os reruns (a cada interação) apenas leiam os valores prontos
+    st.session_state["data"] = df
+    st.session_state["total"] = total_valor(df)
+    st.session_state["fingerprint"] = df_fingerprint(df)
+    # Dicionário de fornecedores: o filtro busca só nos nomes distintos
+    codes, uniques = pd.factorize(df["FORNECEDOR"].astype(TEXT_DTYPE).fillna(""))
+    st.session_state["forn_codes"] = codes
+    st.session_state["forn_uniques"] = uniques
+    names = pd.Series(uniques, dtype=TEXT_DTYPE).str.strip()
+    st.session_state["forn_count"] = names[names != ""].nunique()
+
 # =========================
 # Estado inicial
 # =========================
 if "data" not in st.session_state:
-    st.session_state["data"] = empty_df()
+    set_base(empty_df())
 
 # =========================
 # UI
@@ -192,13 +372,14 @@ with st.sidebar:
             st.warning("Selecione um arquivo.")
         else:
             try:
-                incoming = detect_and_load_excel(up)
+                incoming = detect_and_load_excel(up.getvalue())
                 if mode.startswith("Substituir"):
-                    st.session_state["data"], added, skipped = merge_import(st.session_state["data"], incoming, mode="replace")
+                    new_base, added, skipped = merge_import(st.session_state["data"], incoming, mode="replace")
                 else:
-                    st.session_state["data"], added, skipped = merge_import(st.session_state["data"], incoming, mode="append_nodedup")
+                    new_base, added, skipped = merge_import(st.session_state["data"], incoming, mode="append_nodedup")
+                set_base(new_base)
 
-                total = pd.to_numeric(st.session_state["data"]["VALOR"], errors="coerce").fillna(0.0).sum()
+                total = st.session_state["total"]
                 st.success(f"Importação concluída: {added} novos registros adicionados, {skipped} ignorados por duplicidade. Total atual: {brl(total)}")
             except Exception as e:
                 st.error(f"Falha ao importar: {e}")
@@ -206,10 +387,20 @@ with st.sidebar:
 st.markdown("#### Lançamentos cadastrados")
 st.caption("Edite diretamente na grade; clique em **Salvar alterações** para gravar na sessão.")
 
-# Editor (CRUD)
+# Editor (CRUD) — paginado, para não serializar a base inteira a cada rerun
+data = st.session_state["data"]
+n_pages = max(1, -(-len(data) // PAGE_SIZE))
+page = 0
+if n_pages > 1:
+    if st.session_state.get("grid_page", 1) > n_pages:
+        st.session_state["grid_page"] = n_pages
+    page = int(st.number_input("Página", min_value=1, max_value=n_pages, step=1, key="grid_page")) - 1
+    st.caption(f"{len(data)} registros em {n_pages} páginas de {PAGE_SIZE}. Salve antes de trocar de página.")
+start, end = page * PAGE_SIZE, (page + 1) * PAGE_SIZE
+
 edited_df = st.data_editor(
-    st.session_state["data"],
-    key="grid_main",
+    data.iloc[start:end],
+    key=f"grid_main_{page}",
     num_rows="dynamic",
     use_container_width=True,
     column_config={
@@ -224,32 +415,40 @@ edited_df = st.data_editor(
 col_save, col_clear = st.columns([1,1])
 with col_save:
     if st.button("💾 Salvar alterações", key="btn_save"):
-        edited_df["FORNECEDOR"] = edited_df["FORNECEDOR"].map(norm_text)
-        edited_df["CNPJ"] = edited_df["CNPJ"].map(only_digits)
-        edited_df["NUMERO"] = edited_df["NUMERO"].map(norm_numero)
-        edited_df["DATA"] = pd.to_datetime(edited_df["DATA"], errors="coerce")
-        edited_df["VALOR"] = edited_df["VALOR"].apply(parse_val).fillna(0.0)
-        st.session_state["data"] = edited_df.reset_index(drop=True)
+        edited_df["FORNECEDOR"] = norm_text(edited_df["FORNECEDOR"])
+        edited_df["CNPJ"] = only_digits(edited_df["CNPJ"])
+        edited_df["NUMERO"] = norm_numero(edited_df["NUMERO"])
+        edited_df["DATA"] = as_datetime(edited_df["DATA"])
+        edited_df["VALOR"] = parse_val(edited_df["VALOR"]).fillna(0.0).round(2)
+        if n_pages > 1:
+            # Recoloca a página editada (com linhas incluídas/excluídas) no lugar
+            edited_df = pd.concat([data.iloc[:start], edited_df, data.iloc[end:]], ignore_index=True)
+        else:
+            # O data_editor já devolve um DataFrame novo: reindexa sem copiar
+            edited_df.index = pd.RangeIndex(len(edited_df))
+        set_base(edited_df)
         st.success("Alterações salvas.")
 
 with col_clear:
     if st.button("🗑️ Limpar tudo", key="btn_clear"):
-        st.session_state["data"] = empty_df()
+        set_base(empty_df())
         st.success("Base zerada.")
 
 st.markdown("---")
 
 # Métricas + download (sempre renderizado)
 base = st.session_state["data"]
-total = pd.to_numeric(base["VALOR"], errors="coerce").fillna(0.0).sum()
-forn_count = base["FORNECEDOR"].astype(str).str.strip().replace("", pd.NA).dropna().nunique()
+total = st.session_state["total"]
+forn_count = st.session_state["forn_count"]
 qtd = len(base)
 colm1, colm2, colm3 = st.columns(3)
 colm1.metric("Total a pagar", brl(total))
 colm2.metric("Fornecedores únicos", forn_count)
 colm3.metric("Registros", qtd)
 
-xls = to_excel_bytes(base)
+# O download_button (Streamlit 1.37) precisa dos bytes já prontos; com a impressão
+# digital vinda de set_base, reruns sem mudança na base só leem o cache
+xls = to_excel_bytes(base, st.session_state["fingerprint"])
 st.download_button(
     label="⬇️ Baixar Excel atualizado",
     data=xls,
@@ -269,17 +468,26 @@ with st.expander("Filtrar visualização (opcional)"):
     with f3:
         min_val = st.number_input("Valor mínimo (R$)", min_value=0.0, value=0.0, step=0.01, key="filtro_min_val_main")
 
-    view = base.copy()
-    if filtro_forn:
-        view = view[view["FORNECEDOR"].astype(str).str.contains(filtro_forn, case=False, na=False)]
-    if filtro_num:
-        view = view[view["NUMERO"].astype(str).str.contains(filtro_num, case=False, na=False)]
-    view = view[pd.to_numeric(view["VALOR"], errors="coerce").fillna(0.0) >= min_val]
+    # Sem filtro ativo a visualização é a própria base; senão compõe uma
+    # única máscara e seleciona uma vez só
+    view = base
+    if filtro_forn or filtro_num or min_val > 0:
+        # Máscara em ndarray: os "&=" não realinham índice a cada critério
+        mask = np.ones(len(base), dtype=bool)
+        if filtro_forn:
+            # Casa o texto contra cada fornecedor distinto uma vez e espalha pelos códigos
+            hit = contains_mask(st.session_state["forn_uniques"], filtro_forn)
+            mask &= hit[st.session_state["forn_codes"]]
+        if filtro_num:
+            mask &= contains_mask(base["NUMERO"], filtro_num)
+        if min_val > 0:
+            mask &= base["VALOR"].to_numpy() >= min_val
+        view = base[mask]
 
     if not view.empty:
         show = view.copy()
         show["DATA"] = fmt_date_col(show["DATA"])
-        show["VALOR"] = pd.to_numeric(show["VALOR"], errors="coerce").fillna(0.0).map(brl)
+        show["VALOR"] = brl_series(pd.to_numeric(show["VALOR"], errors="coerce"))
         st.dataframe(show, use_container_width=True)
     else:
         st.info("Sem resultados para os filtros atuais.")